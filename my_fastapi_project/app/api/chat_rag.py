@@ -2,10 +2,15 @@
 支持混合检索：语义检索 + BM25 关键词检索
 """
 
+import asyncio
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Optional
-from langchain_community.chat_models import ChatZhipuAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
@@ -13,12 +18,15 @@ from dotenv import load_dotenv
 import os
 
 from app.api.users import get_current_active_user
+from app.llm import get_chat_model
 from app.models.user import User
 from app.rag.vector_store import LocalEmbeddings, ZhipuEmbeddings, load_faiss_index
 from app.rag.hybrid_retriever import BM25Retriever, combine_results
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/rag", tags=["智能问答RAG"])
 
 # 全局变量
@@ -26,11 +34,161 @@ api_key = os.getenv("DASHSCOPE_API_KEY", "")
 vector_store = None
 rag_chain = None
 bm25_retriever = None
+embeddings_model = None
+
+# 问答缓存：精确匹配缓存 + 语义缓存
+# 精确缓存按 (问题, 检索模式, 权重) 命中；语义缓存按问题向量的余弦相似度命中
+_CACHE_MAX_SIZE = 1024
+_SEMANTIC_CACHE_THRESHOLD = 0.95
+_exact_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_semantic_cache_index = None  # faiss.IndexFlatIP，延迟创建
+_semantic_cache_entries: list = []  # [(key_settings, answer_dict), ...]，与索引行对齐
+
+
+def _cache_key(question: "Question") -> tuple:
+    """构造精确缓存的键"""
+    return (
+        question.question,
+        question.use_hybrid,
+        question.semantic_weight,
+        question.bm25_weight,
+    )
+
+
+def _semantic_cache_lookup(query_vec: np.ndarray, settings: tuple):
+    """在语义缓存中查找相似问题，命中返回缓存的回答，否则返回 None"""
+    if _semantic_cache_index is None or _semantic_cache_index.ntotal == 0:
+        return None
+
+    scores, indices = _semantic_cache_index.search(query_vec, 1)
+    if scores[0][0] >= _SEMANTIC_CACHE_THRESHOLD:
+        cached_settings, answer = _semantic_cache_entries[indices[0][0]]
+        if cached_settings == settings:
+            return answer
+    return None
+
+
+def _semantic_cache_insert(query_vec: np.ndarray, settings: tuple, answer: dict):
+    """将问题向量和回答插入语义缓存（满时整体清空，简单 FIFO 约束）"""
+    global _semantic_cache_index
+
+    import faiss
+
+    if _semantic_cache_index is None:
+        _semantic_cache_index = faiss.IndexFlatIP(query_vec.shape[1])
+
+    if _semantic_cache_index.ntotal >= _CACHE_MAX_SIZE:
+        # IndexFlatIP 不支持逐条删除，满时直接重建
+        _semantic_cache_index.reset()
+        _semantic_cache_entries.clear()
+
+    _semantic_cache_index.add(query_vec)
+    _semantic_cache_entries.append((settings, answer))
+
+
+def _exact_cache_put(key: tuple, answer: dict):
+    """插入精确缓存，超过容量时按 FIFO 淘汰最旧条目"""
+    _exact_cache[key] = answer
+    if len(_exact_cache) > _CACHE_MAX_SIZE:
+        _exact_cache.popitem(last=False)
+
+
+async def _embed_question(text: str):
+    """将问题嵌入为归一化向量（用于语义缓存），失败时返回 None"""
+    if embeddings_model is None:
+        return None
+    try:
+        vec = await asyncio.to_thread(embeddings_model.embed_query, text)
+        vec = np.asarray([vec], dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+    except Exception as e:
+        logger.warning("语义缓存嵌入失败: %s", e)
+        return None
+
+
+# 每个文档送入 LLM 的最大字符数，控制上下文 token 消耗
+_DOC_CHAR_BUDGET = int(os.getenv("RAG_DOC_CHAR_BUDGET", "800"))
+
+
+def format_docs(docs, budget: int = None):
+    """格式化检索到的文档：按内容去重并截断到字符预算"""
+    if budget is None:
+        budget = _DOC_CHAR_BUDGET
+
+    seen = set()
+    parts = []
+    for d in docs:
+        h = hash(d.page_content)
+        if h in seen:
+            continue
+        seen.add(h)
+        parts.append(d.page_content[:budget])
 
+    return "\n\n---\n\n".join(parts)
 
-def format_docs(docs):
-    """格式化检索到的文档"""
-    return "\n\n---\n\n".join([d.page_content for d in docs])
+
+# /ask 动态批处理参数：窗口内到达的问题合并为一轮并发 LLM 调用
+_BATCH_MAX_WAIT = float(os.getenv("RAG_BATCH_MAX_WAIT_MS", "75")) / 1000.0
+_BATCH_MAX_SIZE = int(os.getenv("RAG_BATCH_MAX_SIZE", "8"))
+
+
+class QueryBatcher:
+    """
+    问答请求动态批处理器
+
+    把 max_wait 窗口内到达的问题（至多 max_batch 条）合并成一批，
+    用一轮 asyncio.gather 并发提交 LLM。单条请求最多多等一个窗口，
+    换来突发负载下吞吐量按批次规模提升
+    """
+
+    def __init__(self, max_batch: int = _BATCH_MAX_SIZE, max_wait: float = _BATCH_MAX_WAIT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_task = None
+
+    async def submit(self, question_text: str) -> str:
+        """提交一个问题，返回生成的答案"""
+        # 后台任务延迟创建，绑定到当前事件循环
+        if self._worker_task is None or self._worker_task.done():
+            self._worker_task = asyncio.create_task(self._worker())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((question_text, future))
+        return await future
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 第一条请求到达后开窗收集
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            answers = await asyncio.gather(
+                *[rag_chain.ainvoke(q) for q, _ in batch],
+                return_exceptions=True
+            )
+            for (_, future), answer in zip(batch, answers):
+                if future.done():
+                    continue
+                if isinstance(answer, Exception):
+                    future.set_exception(answer)
+                else:
+                    future.set_result(answer)
+
+
+_query_batcher = QueryBatcher()
 
 
 def initialize_rag_system(enable_hybrid: bool = False):
@@ -41,58 +199,49 @@ def initialize_rag_system(enable_hybrid: bool = False):
     Args:
         enable_hybrid: 是否启用混合检索（语义 + BM25）
     """
-    global vector_store, rag_chain, bm25_retriever
+    global vector_store, rag_chain, bm25_retriever, embeddings_model
 
     try:
-        print("="*60)
-        print("初始化 RAG 系统...")
-        print("="*60)
+        logger.info("初始化 RAG 系统...")
 
         # 1. 初始化嵌入模型（使用本地模型）
-        print("\n1. 初始化嵌入模型...")
-        print("   使用本地嵌入模型")
+        logger.debug("1. 初始化本地嵌入模型...")
         embeddings = LocalEmbeddings(model_name="paraphrase-multilingual-MiniLM-L12-v2")
-        print("   ✓ 嵌入模型初始化完成")
+        embeddings_model = embeddings
 
         # 2. 加载 FAISS 索引
-        print("\n2. 加载 FAISS 向量索引...")
         # 索引文件在项目根目录的 faiss_index
         faiss_path = r"F:\code_local\scholar_evaluatin\faiss_index"
 
         if os.path.exists(faiss_path):
             vector_store = load_faiss_index(faiss_path, embeddings)
-            print(f"   ✓ FAISS 索引加载成功: {faiss_path}")
+            logger.debug("2. FAISS 索引加载成功: %s", faiss_path)
         else:
-            print(f"   ✗ FAISS 索引不存在: {faiss_path}")
-            print(f"   提示: 请先运行 'python build_vector_store.py' 构建向量库")
+            logger.warning("FAISS 索引不存在: %s，请先运行 'python build_vector_store.py' 构建向量库", faiss_path)
             return False
 
         # 3. 创建检索器
-        print("\n3. 创建检索器...")
+        logger.debug("3. 创建检索器（混合检索: %s）...", enable_hybrid)
         search_kwargs = {"k": 5}  # 返回最相关的 5 个文档
 
         if enable_hybrid:
-            print("   启用混合检索（语义 + BM25）")
             # 混合检索将在检索时动态实现
             retriever = vector_store.as_retriever(
                 search_type="similarity",
                 search_kwargs=search_kwargs
             )
         else:
-            print("   使用语义检索")
             retriever = vector_store.as_retriever(
                 search_type="similarity",
                 search_kwargs=search_kwargs
             )
-        print("   ✓ 检索器创建完成")
 
         # 4. 初始化 LLM
-        print("\n4. 初始化智谱 GLM-4 模型...")
-        llm = ChatZhipuAI(model="glm-4.7", temperature=0.3, api_key=api_key)
-        print("   ✓ GLM-4 模型初始化完成")
+        logger.debug("4. 初始化智谱 GLM-4 模型...")
+        llm = get_chat_model(model="glm-4.7", temperature=0.3)
 
         # 5. 构建 RAG 链
-        print("\n5. 构建 RAG 链...")
+        logger.debug("5. 构建 RAG 链...")
         prompt = ChatPromptTemplate.from_template("""
 你是一个专业的学术助手。请根据以下检索到的论文相关信息来回答用户的问题。
 
@@ -116,30 +265,19 @@ def initialize_rag_system(enable_hybrid: bool = False):
             | llm
             | StrOutputParser()
         )
-        print("   ✓ RAG 链构建完成")
-
         # 6. 初始化 BM25 检索器（如果启用混合检索）
         if enable_hybrid:
-            print("\n6. 初始化 BM25 检索器...")
+            logger.debug("6. 初始化 BM25 检索器...")
             # 获取所有文档文本
             all_docs = [doc.page_content for doc in vector_store.docstore._dict.values()]
             bm25_retriever = BM25Retriever(all_docs)
-            print("   ✓ BM25 检索器初始化完成")
 
-        print("\n" + "="*60)
-        print("✓ RAG 系统初始化成功!")
-        print(f"混合检索: {'已启用' if enable_hybrid else '未启用'}")
-        print("="*60 + "\n")
+        logger.info("RAG 系统初始化成功（混合检索: %s）", "已启用" if enable_hybrid else "未启用")
 
         return True
 
     except Exception as e:
-        print("\n" + "="*60)
-        print("✗ RAG 系统初始化失败!")
-        print(f"错误: {str(e)}")
-        print("="*60 + "\n")
-        import traceback
-        traceback.print_exc()
+        logger.error("RAG 系统初始化失败: %s", e, exc_info=True)
         return False
 
 
@@ -176,27 +314,46 @@ async def ask(question: Question):
                     detail="RAG 系统未初始化，请先构建向量库（运行 python build_vector_store.py）"
                 )
 
-        print(f"\n{'='*60}")
-        print(f"收到问答请求")
-        print(f"问题: {question.question}")
-        print(f"检索模式: {'混合检索' if question.use_hybrid else '语义检索'}")
-        print(f"{'='*60}\n")
+        logger.info("收到问答请求: %s（%s）", question.question,
+                    "混合检索" if question.use_hybrid else "语义检索")
+
+        # 先查缓存：精确匹配 → 语义相似匹配
+        cache_key = _cache_key(question)
+        if cache_key in _exact_cache:
+            logger.debug("精确缓存命中，直接返回")
+            return _exact_cache[cache_key]
+
+        settings = cache_key[1:]
+        query_vec = await _embed_question(question.question)
+        if query_vec is not None:
+            cached = _semantic_cache_lookup(query_vec, settings)
+            if cached is not None:
+                logger.debug("语义缓存命中，直接返回")
+                return cached
 
         retrieval_method = "semantic"
         scores = []
 
         if question.use_hybrid:
             # 混合检索
-            print("1. 执行混合检索（语义 + BM25）...")
+            logger.debug("1. 执行混合检索（语义 + BM25）...")
 
-            # 语义检索
             retriever = vector_store.as_retriever(search_kwargs={"k": 10})
-            semantic_docs = retriever.invoke(question.question)
 
-            # BM25 检索
-            all_docs = [doc.page_content for doc in vector_store.docstore._dict.values()]
-            bm25_retriever = BM25Retriever(all_docs)
-            bm25_results = bm25_retriever.retrieve(question.question, top_k=10)
+            # BM25 检索器（纯 CPU）放到线程池，与语义检索的网络 I/O 并发执行
+            # 复用全局 BM25 检索器，避免每次请求重新分词整个语料库
+            def _bm25_search():
+                global bm25_retriever
+                if bm25_retriever is None:
+                    all_docs = [doc.page_content for doc in vector_store.docstore._dict.values()]
+                    bm25_retriever = BM25Retriever(all_docs)
+                return bm25_retriever.retrieve(question.question, top_k=10)
+
+            # 语义检索 + BM25 检索并发执行
+            semantic_docs, bm25_results = await asyncio.gather(
+                retriever.ainvoke(question.question),
+                asyncio.to_thread(_bm25_search)
+            )
 
             # 合并结果
             semantic_scores = [(i, 1.0) for i, doc in enumerate(semantic_docs)]
@@ -220,16 +377,15 @@ async def ask(question: Question):
                     })
 
             retrieval_method = "hybrid"
-            print(f"   混合检索完成，找到 {len(relevant_docs)} 个相关文档")
+            logger.debug("混合检索完成，找到 %d 个相关文档", len(relevant_docs))
 
         else:
             # 纯语义检索
-            print("1. 执行语义检索...")
+            logger.debug("1. 执行语义检索...")
             retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-            relevant_docs = retriever.invoke(question.question)
+            relevant_docs = await retriever.ainvoke(question.question)
 
-            retrieval_count = len(relevant_docs)
-            print(f"   语义检索完成，找到 {retrieval_count} 个相关文档")
+            logger.debug("语义检索完成，找到 %d 个相关文档", len(relevant_docs))
 
         # 格式化源文档
         sources = []
@@ -239,12 +395,10 @@ async def ask(question: Question):
             sources.append(content[:200] + "..." if len(content) > 200 else content)
 
         # 生成答案
-        print("2. 生成答案...")
-        answer = rag_chain.invoke(question.question)
+        logger.debug("2. 生成答案...")
+        answer = await _query_batcher.submit(question.question)
 
-        print(f"   答案生成成功\n")
-
-        return {
+        result = {
             "answer": answer,
             "sources": sources,
             "retrieval_count": len(relevant_docs),
@@ -252,13 +406,18 @@ async def ask(question: Question):
             "scores": scores if question.use_hybrid else None
         }
 
+        # 写入缓存，供后续重复/相似问题直接返回
+        _exact_cache_put(cache_key, result)
+        if query_vec is not None:
+            _semantic_cache_insert(query_vec, settings, result)
+
+        return result
+
     except HTTPException as he:
-        print(f"\nHTTP错误: {he.status_code} - {he.detail}\n")
+        logger.warning("HTTP错误: %s - %s", he.status_code, he.detail)
         raise he
     except Exception as e:
-        print(f"\n处理问题时出错: {str(e)}\n")
-        import traceback
-        traceback.print_exc()
+        logger.error("处理问题时出错: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -271,7 +430,7 @@ async def rebuild_vector_store(strategy: str = "semantic"):
         strategy: 分割策略 (semantic, recursive, structured)
     """
     try:
-        print(f"\n开始重建向量库，分割策略: {strategy}...")
+        logger.info("开始重建向量库，分割策略: %s...", strategy)
 
         from app.rag.vector_store import build_and_save_vector_store
 
@@ -285,7 +444,9 @@ async def rebuild_vector_store(strategy: str = "semantic"):
         )
 
         if result:
-            # 重新初始化 RAG 系统
+            # 重新初始化 RAG 系统（语料已变，BM25 检索器作废）
+            global bm25_retriever
+            bm25_retriever = None
             initialize_rag_system()
             return {
                 "status": "success",
@@ -296,12 +457,22 @@ async def rebuild_vector_store(strategy: str = "semantic"):
             raise HTTPException(status_code=500, detail="向量库重建失败")
 
     except Exception as e:
-        print(f"重建向量库失败: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("重建向量库失败: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/reset", summary="重置 BM25 检索器缓存")
+async def reset_bm25_cache():
+    """
+    重置缓存的 BM25 检索器
+
+    在向量库被外部重建后调用，下一次混合检索会重新构建 BM25 索引
+    """
+    global bm25_retriever
+    bm25_retriever = None
+    return {"status": "success", "message": "BM25 检索器缓存已重置"}
+
+
 @router.get("/status", summary="检查 RAG 系统状态")
 async def check_status():
     """
@@ -323,9 +494,3 @@ async def check_status():
         "faiss_index_path": faiss_path
     }
 
-
-# 启动时自动初始化（可选，默认不启用混合检索）
-try:
-    initialize_rag_system(enable_hybrid=False)
-except Exception as e:
-    print(f"启动时 RAG 初始化失败: {e}")
@@ -1,6 +1,8 @@
+import asyncio
+import logging
+
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from langchain_community.chat_models import ChatZhipuAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 import os
@@ -8,8 +10,13 @@ from dotenv import load_dotenv
 import httpx
 import json
 
+from app.llm import get_chat_model
+from app.utils import extract_json
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/navigator", tags=["研究向导"])
 
 
@@ -40,21 +47,8 @@ class ResearchPathResponse(BaseModel):
     scholars: list[Scholar]
 
 
-# 初始化 GLM-4 模型
-api_key = os.getenv("DASHSCOPE_API_KEY", "")
-if not api_key:
-    raise ValueError("未设置 DASHSCOPE_API_KEY 环境变量")
-
-llm = ChatZhipuAI(model="glm-4", temperature=0.7, api_key=api_key)
-
-
-def generate_research_path(topic: str, language: str = "zh") -> dict:
-    """
-    使用 GLM-4 生成研究路径
-    """
-    lang_instruction = "中文" if language == "zh" else "英文"
-    
-    prompt_template = ChatPromptTemplate.from_template("""
+# 提示词模板在模块加载时解析一次，避免每次请求重新构建
+_RESEARCH_PATH_PROMPT = ChatPromptTemplate.from_template("""
 你是一个专业的学术研究向导。请为用户的研究领域 "{topic}" 生成一条学习路径。
 
 请严格按照以下JSON格式返回结果（不要添加任何其他文字说明）：
@@ -102,43 +96,7 @@ def generate_research_path(topic: str, language: str = "zh") -> dict:
 请使用{lang_instruction}输出。
 """)
 
-    try:
-        chain = prompt_template | llm
-        response = chain.invoke({"topic": topic, "lang_instruction": lang_instruction})
-        
-        # 将 AIMessage 转换为字符串
-        response_str = str(response.content) if hasattr(response, 'content') else str(response)
-        
-        # 尝试解析 JSON
-        json_start = response_str.find("{")
-        json_end = response_str.rfind("}") + 1
-        if json_start != -1 and json_end > json_start:
-            json_str = response_str[json_start:json_end]
-            result = json.loads(json_str)
-            return result
-        else:
-            # 如果没有找到 JSON，返回结构化数据
-            return {
-                "foundation": [],
-                "core": [],
-                "frontier": []
-            }
-    except Exception as e:
-        print(f"生成研究路径时出错: {e}")
-        return {
-            "foundation": [],
-            "core": [],
-            "frontier": []
-        }
-
-
-def generate_scholars(topic: str, language: str = "zh") -> list[dict]:
-    """
-    使用 GLM-4 推荐核心学者
-    """
-    lang_instruction = "中文" if language == "zh" else "英文"
-    
-    prompt_template = ChatPromptTemplate.from_template("""
+_SCHOLARS_PROMPT = ChatPromptTemplate.from_template("""
 请为研究领域 "{topic}" 推荐 3-5 位核心学者。
 
 请严格按照以下JSON格式返回结果（不要添加任何其他文字说明）：
@@ -160,24 +118,60 @@ def generate_scholars(topic: str, language: str = "zh") -> list[dict]:
 请使用{lang_instruction}输出。
 """)
 
+
+async def generate_research_path(topic: str, language: str = "zh") -> dict:
+    """
+    使用 GLM-4 生成研究路径
+    """
+    lang_instruction = "中文" if language == "zh" else "英文"
+
     try:
-        chain = prompt_template | llm
-        response = chain.invoke({"topic": topic, "lang_instruction": lang_instruction})
-        
+        chain = _RESEARCH_PATH_PROMPT | get_chat_model("glm-4", 0.7)
+        response = await chain.ainvoke({"topic": topic, "lang_instruction": lang_instruction})
+
         # 将 AIMessage 转换为字符串
         response_str = str(response.content) if hasattr(response, 'content') else str(response)
-        
+
+        # 尝试解析 JSON（单次扫描提取配平切片，orjson 解析）
+        result = extract_json(response_str)
+        if result is not None:
+            return result
+
+        # 如果没有找到 JSON，返回结构化数据
+        return {
+            "foundation": [],
+            "core": [],
+            "frontier": []
+        }
+    except Exception as e:
+        logger.error("生成研究路径时出错: %s", e)
+        return {
+            "foundation": [],
+            "core": [],
+            "frontier": []
+        }
+
+
+async def generate_scholars(topic: str, language: str = "zh") -> list[dict]:
+    """
+    使用 GLM-4 推荐核心学者
+    """
+    lang_instruction = "中文" if language == "zh" else "英文"
+
+    try:
+        chain = _SCHOLARS_PROMPT | get_chat_model("glm-4", 0.7)
+        response = await chain.ainvoke({"topic": topic, "lang_instruction": lang_instruction})
+
+        # 将 AIMessage 转换为字符串
+        response_str = str(response.content) if hasattr(response, 'content') else str(response)
+
         # 尝试解析 JSON
-        json_start = response_str.find("[")
-        json_end = response_str.rfind("]") + 1
-        if json_start != -1 and json_end > json_start:
-            json_str = response_str[json_start:json_end]
-            result = json.loads(json_str)
+        result = extract_json(response_str, opener="[", closer="]")
+        if result is not None:
             return result
-        else:
-            return []
+        return []
     except Exception as e:
-        print(f"生成学者推荐时出错: {e}")
+        logger.error("生成学者推荐时出错: %s", e)
         return []
 
 
@@ -187,11 +181,13 @@ async def generate_navigator(request: ResearchRequest):
     根据研究方向生成学习路径和学者推荐
     """
     try:
-        print(f"生成研究路径: {request.topic}")
+        logger.info("生成研究路径: %s", request.topic)
         
-        # 并发生成路径和学者推荐
-        path = generate_research_path(request.topic, request.language)
-        scholars = generate_scholars(request.topic, request.language)
+        # 并发生成路径和学者推荐，两次 LLM 调用互不依赖
+        path, scholars = await asyncio.gather(
+            generate_research_path(request.topic, request.language),
+            generate_scholars(request.topic, request.language)
+        )
         
         return ResearchPathResponse(
             topic=request.topic,
@@ -199,7 +195,5 @@ async def generate_navigator(request: ResearchRequest):
             scholars=scholars
         )
     except Exception as e:
-        print(f"生成研究路径时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("生成研究路径时出错: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
@@ -1,33 +1,65 @@
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
-from langchain_community.chat_models import ChatZhipuAI
 from langchain_core.prompts import ChatPromptTemplate
+import logging
 import os
 from dotenv import load_dotenv
 import json
 import re
-from app.db.mongodb import get_mongo_collection
+from app.db.mongodb import get_async_mongo_collection, ensure_paper_indexes
+from app.llm import get_chat_model
 from app.models.paper import Paper, PaperSearchResult, QueryRequest
+from app.utils import find_balanced_slice, loads_fast
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/papers", tags=["论文搜索"])
 
+# 预编译正则表达式，避免每次请求重新编译
+_MD_FENCE = re.compile(r'```(?:python|json)?\s*', re.IGNORECASE)
+_TRAIL_COMMA_OBJ = re.compile(r',\s*}')
+_TRAIL_COMMA_ARR = re.compile(r',\s*\]')
+# 纯年份查询的快速路径，无需调用 LLM
+_YEAR_ONLY = re.compile(r'^\s*((?:19|20)\d{2})\s*(?:年)?\s*$')
 
-# 初始化 GLM-4 模型
-api_key = os.getenv("DASHSCOPE_API_KEY", "")
-if not api_key:
-    raise ValueError("未设置 DASHSCOPE_API_KEY 环境变量")
+# 启动时确保检索索引存在（MongoDB 不可用时不影响接口加载）
+try:
+    ensure_paper_indexes()
+except Exception as e:
+    logger.warning("创建 MongoDB 索引失败（将继续启动）: %s", e)
 
-llm = ChatZhipuAI(model="glm-4", temperature=0.1, api_key=api_key)
 
+def _rewrite_keyword_regex(query: dict) -> dict:
+    """
+    将关键词上的 $regex 模糊匹配改写为 $text 全文检索
 
-def parse_query_to_mongodb(message: str) -> dict:
+    $regex 在未锚定时只能全集合扫描，$text 走文本索引
     """
-    使用 GLM-4 将自然语言查询转换为 MongoDB 查询条件
+    keyword_cond = query.get("关键词")
+    if isinstance(keyword_cond, dict) and "$regex" in keyword_cond:
+        term = keyword_cond["$regex"]
+        query = {k: v for k, v in query.items() if k != "关键词"}
+        query["$text"] = {"$search": term}
+    return query
+
+
+def _paper_from_doc(doc: dict) -> Paper:
     """
-    # 使用 f-string + 三重引号，避免 .format() 的花括号冲突
-    prompt = f"""你是一个专业的学术查询助手。请将用户的自然语言查询转换为 MongoDB 查询条件。
+    从受信任的数据库文档构造 Paper，跳过 Pydantic 校验
+
+    model_construct 不做别名解析，手动映射 "期刊/会议名称" 字段
+    """
+    venue = doc.pop("期刊/会议名称", None)
+    if venue is not None:
+        doc["期刊_会议名称"] = venue
+    return Paper.model_construct(**doc)
+
+
+# 提示词的固定部分在模块加载时构造一次，调用时只拼接用户消息
+# （普通字符串拼接，不走 .format()，JSON 示例里的花括号无需转义）
+_PARSE_QUERY_PROMPT = """你是一个专业的学术查询助手。请将用户的自然语言查询转换为 MongoDB 查询条件。
 
 数据库集合 papers 的字段如下（全部为中文）：
 - 文献类型: 期刊 或 会议
@@ -38,55 +70,66 @@ def parse_query_to_mongodb(message: str) -> dict:
 - 关键词: 关键词列表（逗号分隔）
 - 摘要: 论文摘要
 
-用户消息: {message}
-
 请生成 MongoDB 查询条件，格式为 Python dict。
 例如：
-- 年份查询: {{"发表时间": "2023"}}
-- 关键词查询: {{"关键词": {{"$regex": "图像分割", "$options": "i"}}}}
-- 多条件查询: {{"发表时间": "2023", "关键词": {{"$regex": "图像分割", "$options": "i"}}}}
+- 年份查询: {"发表时间": "2023"}
+- 关键词查询: {"关键词": {"$regex": "图像分割", "$options": "i"}}
+- 多条件查询: {"发表时间": "2023", "关键词": {"$regex": "图像分割", "$options": "i"}}
 
 重要说明：
 1. 只返回 JSON 格式的查询条件，不要有任何其他文字
 2. 使用正则表达式进行模糊匹配，并添加 $options: "i" 实现不区分大小写
 3. 确保字段名与数据库字段名完全一致（使用中文）
-4. 如果查询不明确，返回空字典 {{}}
+4. 如果查询不明确，返回空字典 {}
 5. 不要使用 $or、$and 等复杂操作符，保持简单查询
-"""
+
+用户消息: """
+
+
+def parse_query_to_mongodb(message: str) -> dict:
+    """
+    使用 GLM-4 将自然语言查询转换为 MongoDB 查询条件
+    """
+    # 快速路径：消息就是一个年份（如 "2024" / "2024年"），不必走 LLM
+    year_match = _YEAR_ONLY.match(message)
+    if year_match:
+        return {"发表时间": year_match.group(1)}
+
+    prompt = _PARSE_QUERY_PROMPT + message
 
     try:
         response_str = ""
         try:
+            # 首次调用时才构建 LLM 客户端（lru_cache 工厂，跨模块共享实例）；
+            # 未配置 API Key 时不影响其他接口启动
+            llm = get_chat_model(model="glm-4", temperature=0.1)
             response = llm.invoke(prompt)
             response_str = str(response.content) if hasattr(response, 'content') else str(response)
         except Exception as e:
-            print(f"LLM调用出错: {e}")
+            logger.error("LLM调用出错: %s", e)
             return {}
 
         # 清理可能的 markdown 代码块
-        response_str = re.sub(r'```(?:python|json)?\s*', '', response_str, flags=re.IGNORECASE)
-        response_str = re.sub(r'```\s*', '', response_str)
-
-        # 提取最外层的 dict
-        dict_start = response_str.find("{")
-        dict_end = response_str.rfind("}") + 1
-        if dict_start != -1 and dict_end > dict_start:
-            dict_str = response_str[dict_start:dict_end]
-            # 替换单引号为双引号（JSON 标准）
-            dict_str = dict_str.replace("'", '"')
-            # 修复可能的尾随逗号（非标准 JSON）
-            dict_str = re.sub(r',\s*}', '}', dict_str)
-            dict_str = re.sub(r',\s*\]', ']', dict_str)
-            result = json.loads(dict_str)
-            print(f"解析后的查询: {result}")
-            return result
-        else:
-            print(f"未找到有效的dict: {response_str[:200]}")
-            return {}
+        response_str = _MD_FENCE.sub('', response_str)
+
+        # 单次扫描提取配平的 dict
+        dict_str = find_balanced_slice(response_str)
+        if dict_str is not None:
+            result = loads_fast(dict_str)
+            if result is None:
+                # 非标准 JSON：替换单引号、去掉尾随逗号后重试
+                dict_str = dict_str.replace("'", '"')
+                dict_str = _TRAIL_COMMA_OBJ.sub('}', dict_str)
+                dict_str = _TRAIL_COMMA_ARR.sub(']', dict_str)
+                result = loads_fast(dict_str)
+            if result is not None:
+                logger.debug("解析后的查询: %s", result)
+                return result
+
+        logger.warning("未找到有效的dict: %s", response_str[:200])
+        return {}
     except Exception as e:
-        print(f"解析查询时出错: {e}")
-        if 'response_str' in locals():
-            print(f"原始响应: {response_str}")
+        logger.error("解析查询时出错: %s（原始响应: %s）", e, locals().get('response_str', ''))
         return {}
 
 
@@ -96,23 +139,22 @@ async def search_papers(request: QueryRequest):
     根据自然语言查询搜索论文
     """
     try:
-        print(f"查询消息: {request.message}")
+        logger.info("查询消息: %s", request.message)
 
         # 将自然语言转换为 MongoDB 查询
         query = parse_query_to_mongodb(request.message)
-        print(f"生成的查询: {query}")
+        query = _rewrite_keyword_regex(query)
+        logger.debug("生成的查询: %s", query)
 
-        # 执行查询
-        papers_collection = get_mongo_collection("scholar_papers", "scholar_papers")
-        cursor = papers_collection.find(query).limit(50)
+        # 执行查询（异步流式读取，不阻塞事件循环）
+        # 用投影在服务端去掉 _id，省去 Python 层的删除循环
+        papers_collection = get_async_mongo_collection("scholar_papers", "scholar_papers")
+        cursor = papers_collection.find(query, {"_id": 0}).limit(50)
 
         # 转换结果
         papers = []
-        for doc in cursor:
-            # 移除 MongoDB 的 _id 字段
-            if "_id" in doc:
-                del doc["_id"]
-            papers.append(Paper(**doc))
+        async for doc in cursor:
+            papers.append(_paper_from_doc(doc))
 
         return PaperSearchResult(
             query=query,
@@ -120,9 +162,7 @@ async def search_papers(request: QueryRequest):
             total=len(papers)
         )
     except Exception as e:
-        print(f"搜索论文时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("搜索论文时出错: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
 
@@ -132,16 +172,15 @@ async def get_all_papers(limit: int = 50, skip: int = 0):
     获取所有论文（分页）
     """
     try:
-        papers_collection = get_mongo_collection("scholar_papers", "scholar_papers")
-        cursor = papers_collection.find().skip(skip).limit(limit)
+        papers_collection = get_async_mongo_collection("scholar_papers", "scholar_papers")
+        cursor = papers_collection.find({}, {"_id": 0}).skip(skip).limit(limit)
 
         papers = []
-        for doc in cursor:
-            if "_id" in doc:
-                del doc["_id"]
-            papers.append(Paper(**doc))
+        async for doc in cursor:
+            papers.append(_paper_from_doc(doc))
 
-        total = papers_collection.count_documents({})
+        # estimated_document_count 读取元数据，O(1)，不扫描集合
+        total = await papers_collection.estimated_document_count()
 
         return {
             "papers": papers,
@@ -159,16 +198,14 @@ async def execute_query(query: dict = Body(..., description="MongoDB 查询条
     直接执行 MongoDB 查询
     """
     try:
-        print(f"执行查询: {query}")
+        logger.info("执行查询: %s", query)
 
-        papers_collection = get_mongo_collection("scholar_papers", "scholar_papers")
-        cursor = papers_collection.find(query).limit(50)
+        papers_collection = get_async_mongo_collection("scholar_papers", "scholar_papers")
+        cursor = papers_collection.find(query, {"_id": 0}).limit(50)
 
         papers = []
-        for doc in cursor:
-            if "_id" in doc:
-                del doc["_id"]
-            papers.append(Paper(**doc))
+        async for doc in cursor:
+            papers.append(_paper_from_doc(doc))
 
         return {
             "query": query,
@@ -176,7 +213,5 @@ async def execute_query(query: dict = Body(..., description="MongoDB 查询条
             "total": len(papers)
         }
     except Exception as e:
-        print(f"执行查询时出错: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("执行查询时出错: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
@@ -1,7 +1,11 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from datetime import timedelta, datetime
+from functools import lru_cache
+import time
 from jose import JWTError, jwt
 from typing import Optional
 
@@ -15,8 +19,8 @@ load_dotenv()
 
 router = APIRouter(prefix="/api/users", tags=["用户管理"])
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码加密上下文（显式指定 bcrypt 代价因子，默认 12 轮验证一次约 250ms）
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=10, deprecated="auto")
 
 # JWT配置
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -46,19 +50,34 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# 缓存 token 解码结果：同一个 token 在会话期内会被重复使用成百上千次
+# 过期校验交给 verify_token 基于缓存的 payload 完成
+@lru_cache(maxsize=4096)
+def _decode_token_cached(token: str) -> dict:
+    return jwt.decode(
+        token, SECRET_KEY, algorithms=[ALGORITHM],
+        options={"verify_exp": False}
+    )
+
+
 # 验证JWT token
 def verify_token(token: str, credentials_exception: HTTPException) -> TokenData:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: Optional[str] = payload.get("sub")
-        user_id: Optional[int] = payload.get("user_id")
-        if username is None or user_id is None:
-            raise credentials_exception
-        token_data = TokenData(username=username, user_id=user_id)
-        return token_data
+        payload = _decode_token_cached(token)
     except JWTError:
         raise credentials_exception
 
+    # 缓存结果不含过期校验，这里按当前时间判断
+    exp = payload.get("exp")
+    if exp is None or exp < time.time():
+        raise credentials_exception
+
+    username: Optional[str] = payload.get("sub")
+    user_id: Optional[int] = payload.get("user_id")
+    if username is None or user_id is None:
+        raise credentials_exception
+    return TokenData(username=username, user_id=user_id)
+
 
 # 获取当前用户依赖项
 def get_current_user(
@@ -89,24 +108,23 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     """
     用户注册接口
     """
-    # 检查用户名是否已存在
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="用户名已存在"
-        )
-    
-    # 检查邮箱是否已存在
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    # 用一条 OR 查询同时检查用户名和邮箱冲突，省一次数据库往返
+    existing = db.query(User).filter(
+        (User.username == user.username) | (User.email == user.email)
+    ).first()
+    if existing:
+        if existing.username == user.username:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="用户名已存在"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="邮箱已被注册"
         )
-    
-    # 创建新用户
-    hashed_password = hash_password(user.password)
+
+    # 创建新用户（bcrypt 计算放到线程池，不阻塞事件循环）
+    hashed_password = await asyncio.to_thread(hash_password, user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -137,7 +155,11 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(user_credentials.password, db_user.hashed_password):
+    # bcrypt 校验放到线程池，避免多个登录请求在事件循环上串行
+    password_ok = await asyncio.to_thread(
+        verify_password, user_credentials.password, db_user.hashed_password
+    )
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
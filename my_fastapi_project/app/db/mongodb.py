@@ -1,31 +1,73 @@
 """数据库连接模块 - MongoDB 连接"""
 
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 客户端单例：同步/异步各一个，整个应用共享连接池
+_sync_client = None
+_async_client = None
 
-def get_mongo_client():
+
+def get_async_mongo_client() -> AsyncIOMotorClient:
     """
-    获取 MongoDB 客户端连接
+    获取异步 MongoDB 客户端（单例）
 
     Returns:
-        MongoClient: MongoDB 客户端实例
+        AsyncIOMotorClient: 共享连接池的异步客户端实例
+    """
+    global _async_client
+    if _async_client is None:
+        mongo_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+        _async_client = AsyncIOMotorClient(
+            mongo_url,
+            maxPoolSize=50,
+            compressors="zstd,snappy",
+            serverSelectionTimeoutMS=2000,
+            socketTimeoutMS=10000,
+        )
+    return _async_client
+
+
+def get_async_mongo_collection(db_name: str, collection_name: str):
+    """
+    获取指定集合（异步）
+
+    Args:
+        db_name: 数据库名称
+        collection_name: 集合名称
+
+    Returns:
+        AsyncIOMotorCollection: 异步集合实例
+    """
+    return get_async_mongo_client()[db_name][collection_name]
+
+
+def get_mongo_client() -> MongoClient:
     """
-    # 从环境变量读取连接字符串，如果没有则使用默认值
-    mongo_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    获取同步 MongoDB 客户端连接（单例）
+
+    连接失败由后续操作通过 serverSelectionTimeoutMS 快速暴露，
+    不再在每次获取时 ping 一次 admin 库
 
-    try:
-        client = MongoClient(mongo_url)
-        # 测试连接
-        client.admin.command('ping')
-        print(f"MongoDB 连接成功: {mongo_url}")
-        return client
-    except Exception as e:
-        print(f"MongoDB 连接失败: {str(e)}")
-        raise
+    Returns:
+        MongoClient: 共享连接池的客户端实例
+    """
+    global _sync_client
+    if _sync_client is None:
+        # 从环境变量读取连接字符串，如果没有则使用默认值
+        mongo_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+        _sync_client = MongoClient(
+            mongo_url,
+            maxPoolSize=100,
+            compressors="zstd,snappy",
+            serverSelectionTimeoutMS=2000,
+            socketTimeoutMS=10000,
+        )
+    return _sync_client
 
 
 def get_mongo_database(db_name: str):
@@ -42,6 +84,25 @@ def get_mongo_database(db_name: str):
     return client[db_name]
 
 
+def ensure_paper_indexes(db_name: str = "scholar_papers", collection_name: str = "scholar_papers"):
+    """
+    为论文集合创建检索所需的索引（create_index 是幂等的）
+
+    - 文本索引（关键词/论文题目/摘要）支持 $text 全文检索
+    - 发表时间索引加速年份过滤
+
+    Args:
+        db_name: 数据库名称
+        collection_name: 集合名称
+    """
+    collection = get_mongo_collection(db_name, collection_name)
+    collection.create_index(
+        [("关键词", "text"), ("论文题目", "text"), ("摘要", "text")],
+        name="papers_text_search"
+    )
+    collection.create_index("发表时间")
+
+
 def get_mongo_collection(db_name: str, collection_name: str):
     """
     获取指定集合
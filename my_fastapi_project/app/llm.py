@@ -0,0 +1,33 @@
+"""共享 LLM 客户端模块
+
+各 API 模块通过 get_chat_model 复用同一组 ChatZhipuAI 实例，
+避免每个模块自行构造客户端（重复初始化、各自维护连接）
+"""
+
+from functools import lru_cache
+import os
+
+from langchain_community.chat_models import ChatZhipuAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+@lru_cache(maxsize=None)
+def get_chat_model(model: str = "glm-4", temperature: float = 0.7) -> ChatZhipuAI:
+    """
+    获取共享的 ChatZhipuAI 实例
+
+    按 (model, temperature) 缓存，相同配置的调用方拿到同一个客户端
+
+    Args:
+        model: 模型名称
+        temperature: 采样温度
+
+    Returns:
+        ChatZhipuAI 实例
+    """
+    api_key = os.getenv("DASHSCOPE_API_KEY", "")
+    if not api_key:
+        raise ValueError("未设置 DASHSCOPE_API_KEY 环境变量")
+    return ChatZhipuAI(model=model, temperature=temperature, api_key=api_key)
@@ -1,20 +1,52 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from app.db.session import engine, Base
-from app.api import users, navigator, papers, chat_rag
+import logging
+import logging.handlers
+import queue
+from contextlib import asynccontextmanager
+
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 日志配置：QueueHandler 入队 + QueueListener 后台线程输出
+# 请求协程只做入队操作，格式化和 stdout 写入不再阻塞事件循环
+_log_queue: "queue.Queue" = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+)
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from app.db.session import engine, Base
+from app.api import users, navigator, papers, chat_rag
+
 # 创建所有数据表
-Base.metadata.create_all(bind=engine)
+# 默认开启方便本地开发；多 worker 部署设 AUTO_MIGRATE=0，改用迁移工具建表，
+# 避免每个 worker 启动都对数据库发一轮 CREATE TABLE IF NOT EXISTS
+if os.getenv("AUTO_MIGRATE", "1") == "1":
+    Base.metadata.create_all(bind=engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # RAG 系统在应用启动时初始化一次，不在模块导入时触发
+    chat_rag.initialize_rag_system(enable_hybrid=False)
+    yield
+    # 停掉日志监听线程，冲刷队列中尚未写出的日志
+    _log_listener.stop()
+
 
 # 创建FastAPI应用
 app = FastAPI(
     title="学者评估系统 API",
     description="基于RAG技术的智能问答系统",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 
 # 获取CORS配置
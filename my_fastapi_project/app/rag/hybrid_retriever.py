@@ -1,10 +1,41 @@
 """混合检索模块 - 结合语义检索和关键词检索（BM25）"""
 
+import heapq
 import math
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple
 from collections import Counter
 import re
 
+import numpy as np
+from scipy import sparse
+
+# 分词用的正则在模块加载时编译一次
+# 中英文融合成一个交替模式，每个字符只被扫描一次
+_TOKEN_RE = re.compile('([一-鿿])|([a-zA-Z]+)')
+
+# numba 为可选依赖：缺失时回退到 scipy 的稀疏求和路径
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
+if _HAS_NUMBA:
+    @njit(cache=True, fastmath=True)
+    def _bm25_gather_add(query_term_ids, indptr, indices, data, out):
+        """
+        在 CSR 预打分矩阵上做 gather-add：把命中词行的分数累加到 out
+
+        串行循环即可被 LLVM 向量化；prange 并行会在 out[d] 上产生写竞争，
+        故不使用
+        """
+        for qi in range(len(query_term_ids)):
+            t = query_term_ids[qi]
+            for p in range(indptr[t], indptr[t + 1]):
+                out[indices[p]] += data[p]
+        return out
+
 
 class BM25Retriever:
     """
@@ -37,47 +68,111 @@ class BM25Retriever:
         # 预处理：分词
         self.tokenized_docs = [self._tokenize(doc) for doc in documents]
 
+        # 单次全局扫描：词表、每篇文档的词频和文档频率一遍算完，
+        # 后续的 IDF、打分矩阵和单文档打分都直接查这些结构
+        self.vocab: Dict[str, int] = {}
+        self._doc_tf: List[Dict[str, int]] = []
+        df: Counter = Counter()
+        for tokens in self.tokenized_docs:
+            local: Dict[str, int] = {}
+            for token in tokens:
+                self.vocab.setdefault(token, len(self.vocab))
+                local[token] = local.get(token, 0) + 1
+            self._doc_tf.append(local)
+            df.update(local.keys())
+
         # 构建 IDF 词典
-        self.idf = self._build_idf()
+        self.idf = self._build_idf(df)
 
         # 计算文档平均长度
         self.avg_doc_length = sum(len(tokens) for tokens in self.tokenized_docs) / len(self.tokenized_docs)
 
-    def _tokenize(self, text: str) -> List[str]:
+        # k1*长度归一化常量只算一次，单文档打分的内层循环不再做除法
+        self._k1_ln = np.asarray(
+            [self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+             for tokens in self.tokenized_docs],
+            dtype=np.float32
+        )
+
+        # 预打分稀疏矩阵（BM25S 思路）：索引时一次算好每个 (词, 文档) 的
+        # 完整 BM25 贡献，查询时只需对命中行求和
+        self._score_matrix = self._build_score_matrix()
+
+        # 每个词对任意文档的最大贡献，MaxScore 剪枝的上界
+        self.term_max = np.asarray(self._score_matrix.max(axis=1).todense()).ravel()
+
+    def _build_score_matrix(self) -> "sparse.csr_matrix":
         """
-        分词（简单实现，支持中文和英文）
+        构建预打分矩阵 S[词, 文档] = idf * tf*(k1+1) / (tf + k1*长度归一化)
 
-        Args:
-            text: 输入文本
+        tf 变换和 k1/b 长度归一化全部移出查询循环，检索退化为
+        稀疏行切片 + 按列求和
 
         Returns:
-            分词列表
+            csr_matrix，形状 (词表大小, 文档数)
         """
-        # 中文分词：按字符分割
-        chinese_chars = re.findall(r'[\u4e00-\u9fff]', text)
-
-        # 英文分词：按单词分割（转小写）
-        english_words = re.findall(r'[a-zA-Z]+', text.lower())
+        term_ids = []
+        doc_ids = []
+        tfs = []
+        for doc_id, local in enumerate(self._doc_tf):
+            for term, tf in local.items():
+                term_ids.append(self.vocab[term])
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+
+        n_docs = len(self.tokenized_docs)
+        doc_lens = np.fromiter((len(t) for t in self.tokenized_docs), dtype=np.float32, count=n_docs)
+        length_norm = 1 - self.b + self.b * doc_lens / self.avg_doc_length
+
+        idf_arr = np.zeros(len(self.vocab), dtype=np.float32)
+        for term, term_id in self.vocab.items():
+            idf_arr[term_id] = self.idf[term]
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        score_vals = idf_arr[term_ids] * (tfs * (self.k1 + 1)) / (tfs + self.k1 * length_norm[doc_ids])
+
+        # CSR 便于按词（行）切片；查询只取命中的几行
+        return sparse.csr_matrix(
+            (score_vals, (term_ids, doc_ids)),
+            shape=(len(self.vocab), n_docs),
+            dtype=np.float32
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _tokenize(text: str) -> Tuple[str, ...]:
+        """
+        分词（简单实现，支持中文和英文）
 
-        # 合并中文和英文
-        tokens = chinese_chars + english_words
+        不依赖实例状态，做成带 lru_cache 的静态方法：重复的查询和
+        重建索引时重复的文档不再二次分词。返回元组保证缓存值不可变
 
-        return tokens
+        Args:
+            text: 输入文本
 
-    def _build_idf(self) -> Dict[str, float]:
+        Returns:
+            分词元组
+        """
+        # 中文按字符、英文按单词（转小写），一遍扫描交替匹配；
+        # lastindex 区分命中的分组，避免构造空串元组
+        return tuple(
+            m.group(1) if m.lastindex == 1 else m.group(2).lower()
+            for m in _TOKEN_RE.finditer(text)
+        )
+
+    def _build_idf(self, df: Counter) -> Dict[str, float]:
         """
         构建 IDF (Inverse Document Frequency) 词典
 
+        Args:
+            df: 文档频率（每个词在多少篇文档中出现），由 __init__
+                的单次全局扫描给出
+
         Returns:
             IDF 词典
         """
-        # 计算文档频率
-        df = Counter()
-        for tokens in self.tokenized_docs:
-            # 每个词在文档中只计数一次
-            unique_tokens = set(tokens)
-            df.update(unique_tokens)
-
         # 计算总文档数
         total_docs = len(self.tokenized_docs)
 
@@ -94,61 +189,201 @@ class BM25Retriever:
 
         return idf
 
-    def _score_document(self, query_tokens: List[str], doc_tokens: List[str], doc_length: int) -> float:
+    def _score_document(self, query_tokens: List[str], doc_idx: int) -> float:
         """
         计算单个文档的 BM25 分数
 
+        词频和 k1*长度归一化常量在 __init__ 中已预计算，
+        内层循环只剩查表和一次乘除
+
         Args:
             query_tokens: 查询词列表
-            doc_tokens: 文档词列表
-            doc_length: 文档长度
+            doc_idx: 文档索引
 
         Returns:
             BM25 分数
         """
         score = 0.0
-
-        # 计算文档词频
-        doc_tf = Counter(doc_tokens)
+        doc_tf = self._doc_tf[doc_idx]
+        k1_ln = self._k1_ln[doc_idx]
 
         for token in query_tokens:
             if token in doc_tf and token in self.idf:
-                # BM25 公式
                 tf = doc_tf[token]
-                idf = self.idf[token]
+                score += self.idf[token] * (tf * (self.k1 + 1)) / (tf + k1_ln)
 
-                # 标准化文档长度
-                length_norm = 1 - self.b + self.b * (doc_length / self.avg_doc_length)
+        return score
 
-                # BM25 分数
-                score += idf * (tf * (self.k1 + 1)) / (tf + self.k1 * length_norm)
+    def _query_idf(self, query_tokens: List[str]) -> List[Tuple[str, float]]:
+        """
+        查询词去重并一次性查好 IDF
+
+        每次查询只做一轮 self.idf 字典查找，逐文档打分时
+        直接迭代 (词, idf) 对
+
+        Args:
+            query_tokens: 查询词列表
+
+        Returns:
+            (词, idf) 列表，只含出现在词表中的查询词
+        """
+        return [(token, self.idf[token]) for token in set(query_tokens) if token in self.idf]
+
+    def _score_document_fast(self, q_idf: List[Tuple[str, float]], doc_idx: int) -> float:
+        """
+        用预查好的 (词, idf) 对计算单个文档的 BM25 分数
+
+        Args:
+            q_idf: _query_idf 的返回值
+            doc_idx: 文档索引
+
+        Returns:
+            BM25 分数
+        """
+        score = 0.0
+        doc_tf = self._doc_tf[doc_idx]
+        k1_ln = self._k1_ln[doc_idx]
+
+        for token, idf in q_idf:
+            tf = doc_tf.get(token)
+            if tf:
+                score += idf * (tf * (self.k1 + 1)) / (tf + k1_ln)
 
         return score
 
-    def retrieve(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+    def _retrieve_maxscore(self, rows: List[int], top_k: int) -> np.ndarray:
+        """
+        MaxScore 剪枝的逐词累加打分
+
+        按词的最大贡献降序累加；当第 k 名的当前分数已不可能被
+        榜外文档加上剩余词的上界追平时提前终止，跳过低贡献词的
+        posting 遍历
+
+        Args:
+            rows: 查询词对应的矩阵行号
+            top_k: 目标结果数
+
+        Returns:
+            文档分数向量（触发剪枝时，被跳过词的贡献不再累加）
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(-self.term_max[rows])
+        rows = rows[order]
+
+        # remaining[i] = rows[i+1:] 的最大贡献之和（还能追加的分数上界）
+        maxes = self.term_max[rows]
+        remaining = np.concatenate([np.cumsum(maxes[::-1])[::-1][1:], [0.0]])
+
+        indptr = self._score_matrix.indptr
+        indices = self._score_matrix.indices
+        data = self._score_matrix.data
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+
+        for i, t in enumerate(rows):
+            scores[indices[indptr[t]:indptr[t + 1]]] += data[indptr[t]:indptr[t + 1]]
+
+            if remaining[i] <= 0 or len(scores) <= top_k:
+                continue
+            part = np.partition(scores, len(scores) - top_k)
+            kth = part[len(scores) - top_k]
+            max_other = part[:len(scores) - top_k].max()
+            if kth >= max_other + remaining[i]:
+                break
+
+        return scores
+
+    def retrieve(self, query: str, top_k: int = 5, use_maxscore: bool = False) -> List[Tuple[int, float]]:
         """
         检索最相关的文档
 
         Args:
             query: 查询文本
             top_k: 返回前 k 个结果
+            use_maxscore: 启用 MaxScore 剪枝（多词查询可跳过大量 posting，
+                但触发剪枝时返回的分数是截断累计值，默认关闭保持精确）
 
         Returns:
             (文档索引, 分数) 列表
         """
-        # 分词查询
+        # 分词查询；重复的查询词保留重复行，与逐词累加的语义一致
         query_tokens = self._tokenize(query)
+        rows = [self.vocab[t] for t in query_tokens if t in self.vocab]
+
+        if rows:
+            if use_maxscore and len(rows) > 1:
+                scores = self._retrieve_maxscore(rows, top_k)
+            elif _HAS_NUMBA:
+                # numba 核直接在 CSR 底层数组上累加，省掉行切片的中间矩阵
+                scores = np.zeros(len(self.documents), dtype=np.float32)
+                _bm25_gather_add(
+                    np.asarray(rows, dtype=np.int64),
+                    self._score_matrix.indptr,
+                    self._score_matrix.indices,
+                    self._score_matrix.data,
+                    scores
+                )
+            else:
+                # 行切片 + 按列求和，一次得到所有文档的分数向量
+                scores = np.asarray(self._score_matrix[rows].sum(axis=0)).ravel()
+        else:
+            scores = np.zeros(len(self.documents), dtype=np.float32)
+
+        # argpartition 选出前 k 个，只对这 k 个排序
+        if top_k < len(scores):
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        return [(int(i), float(scores[i])) for i in top]
+
+    def retrieve_batch(self, queries: List[str], top_k: int = 5) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索：Q 个查询合成一次稀疏矩阵乘法
 
-        # 计算每个文档的分数
-        scores = []
-        for idx, doc_tokens in enumerate(self.tokenized_docs):
-            score = self._score_document(query_tokens, doc_tokens, len(doc_tokens))
-            scores.append((idx, score))
+        把所有查询编码成 Q×V 的词袋稀疏矩阵（值为查询词频），
+        与预打分矩阵相乘一次得到 Q×N 的分数矩阵，摊薄逐查询的
+        Python 调用开销
 
-        # 排序并返回前 k 个
-        scores.sort(key=lambda x: x[1], reverse=True)
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回前 k 个结果
 
-        return scores[:top_k]
+        Returns:
+            每个查询的 (文档索引, 分数) 列表
+        """
+        if not queries:
+            return []
+
+        rows = []
+        cols = []
+        data = []
+        for query_id, query in enumerate(queries):
+            for token in self._tokenize(query):
+                term_id = self.vocab.get(token)
+                if term_id is not None:
+                    rows.append(query_id)
+                    cols.append(term_id)
+                    data.append(1.0)
+
+        # 重复的 (查询, 词) 坐标在构造时自动求和成查询词频
+        query_matrix = sparse.csr_matrix(
+            (data, (rows, cols)),
+            shape=(len(queries), len(self.vocab)),
+            dtype=np.float32
+        )
+        scores = np.asarray((query_matrix @ self._score_matrix).todense())
+
+        results = []
+        for row in scores:
+            if top_k < row.shape[0]:
+                top = np.argpartition(-row, top_k)[:top_k]
+            else:
+                top = np.arange(row.shape[0])
+            top = top[np.argsort(-row[top])]
+            results.append([(int(i), float(row[i])) for i in top])
+
+        return results
 
 
 class HybridRetriever:
@@ -238,10 +473,8 @@ class HybridRetriever:
                 "hybrid_score": hybrid_score
             })
 
-        # 4. 排序并返回前 k 个
-        hybrid_scores.sort(key=lambda x: x["hybrid_score"], reverse=True)
-
-        return hybrid_scores[:top_k]
+        # 4. 堆选前 k 个，O(N + k·logN)，不做全量排序
+        return heapq.nlargest(top_k, hybrid_scores, key=lambda x: x["hybrid_score"])
 
     def retrieve_with_rerank(
         self,
@@ -285,10 +518,8 @@ class HybridRetriever:
 
             reranked.append(result_copy)
 
-        # 排序
-        reranked.sort(key=lambda x: x["hybrid_score"], reverse=True)
-
-        return reranked[:top_k]
+        # 堆选前 k 个
+        return heapq.nlargest(top_k, reranked, key=lambda x: x["hybrid_score"])
 
 
 def normalize_scores(scores: List[float]) -> List[float]:
@@ -304,13 +535,15 @@ def normalize_scores(scores: List[float]) -> List[float]:
     if not scores:
         return []
 
-    min_score = min(scores)
-    max_score = max(scores)
+    # 向量化的 min-max 归一化，min/max/减法/除法都是单次 C 循环
+    arr = np.asarray(scores, dtype=np.float32)
+    min_score = arr.min()
+    max_score = arr.max()
 
     if max_score == min_score:
         return [1.0] * len(scores)
 
-    return [(score - min_score) / (max_score - min_score) for score in scores]
+    return ((arr - min_score) / (max_score - min_score)).tolist()
 
 
 def combine_results(
@@ -338,26 +571,33 @@ def combine_results(
     semantic_weight /= total_weight
     bm25_weight /= total_weight
 
-    # 构建分数字典
-    semantic_dict = dict(semantic_results)
-    bm25_dict = dict(bm25_results)
-
-    # 收集所有文档索引
-    all_indices = set(semantic_dict.keys()) | set(bm25_dict.keys())
-
-    # 合并分数
-    combined_scores = []
-    for idx in all_indices:
-        semantic_score = semantic_dict.get(idx, 0.0)
-        bm25_score = bm25_dict.get(idx, 0.0)
-
-        hybrid_score = semantic_weight * semantic_score + bm25_weight * bm25_score
-        combined_scores.append((idx, hybrid_score))
-
-    # 排序并返回前 k 个
-    combined_scores.sort(key=lambda x: x[1], reverse=True)
+    if not semantic_results and not bm25_results:
+        return []
 
-    return combined_scores[:top_k]
+    # 向量化合并：两路索引拼接去重后，把分数散射到对齐的数组里，
+    # 加权求和在一次 NumPy 运算中完成，替代逐索引的 dict 操作
+    sem_ids = np.fromiter((idx for idx, _ in semantic_results), dtype=np.int64, count=len(semantic_results))
+    bm25_ids = np.fromiter((idx for idx, _ in bm25_results), dtype=np.int64, count=len(bm25_results))
+    ids = np.unique(np.concatenate([sem_ids, bm25_ids]))
+
+    # np.unique 的输出有序，searchsorted 给出每个索引在 ids 中的位置
+    sem_scores = np.zeros(len(ids))
+    bm25_scores = np.zeros(len(ids))
+    if len(sem_ids):
+        sem_scores[np.searchsorted(ids, sem_ids)] = [score for _, score in semantic_results]
+    if len(bm25_ids):
+        bm25_scores[np.searchsorted(ids, bm25_ids)] = [score for _, score in bm25_results]
+
+    scores = semantic_weight * sem_scores + bm25_weight * bm25_scores
+
+    # argpartition 选出前 k 个（O(N)），只对这 k 个做排序
+    if top_k < len(ids):
+        top = np.argpartition(-scores, top_k)[:top_k]
+    else:
+        top = np.arange(len(ids))
+    top = top[np.argsort(-scores[top])]
+
+    return [(int(ids[i]), float(scores[i])) for i in top]
 
 
 if __name__ == "__main__":
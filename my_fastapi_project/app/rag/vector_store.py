@@ -3,10 +3,26 @@
 支持混合检索：语义检索 + 关键词检索
 """
 
+import asyncio
+import hashlib
+import json
+import math
 import os
-from typing import List, Dict, Any, Optional, Callable
+import queue as queue_module
+import shelve
+import threading
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator
+from uuid import uuid4
+
+import faiss
+import numpy as np
 from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
 from langchain_community.chat_models import ChatZhipuAI
 from langchain_text_splitters import (
     RecursiveCharacterTextSplitter,
@@ -23,6 +39,49 @@ from app.models.paper import Paper
 
 load_dotenv()
 
+# 结构化分割用的字段边界正则：行首 lookahead 匹配字段名，单次 C 级扫描
+_FIELD_RE = re.compile(r'(?m)^(?=(?:论文题目|摘要|关键词|作者|期刊/会议|发表时间):)')
+
+# 嵌入只用到这几个字段，投影后游标不拉取其余字段（全文、参考文献等）
+_EMBED_PROJECTION = {
+    "论文题目": 1,
+    "摘要": 1,
+    "关键词": 1,
+    "作者": 1,
+    "期刊/会议名称": 1,
+    "发表时间": 1,
+    "_id": 1,
+}
+
+# 递归分割的分隔符优先级，模块加载时构建一次
+_SPLIT_SEPARATORS = [
+    "\n\n",  # 段落
+    "\n",    # 行
+    "。",    # 中文句号
+    "！",    # 中文感叹号
+    "？",    # 中文问号
+    "；",    # 中文分号
+    "，",    # 中文逗号
+    ". ",    # 英文句号
+    "! ",    # 英文感叹号
+    "? ",    # 英文问号
+    "; ",    # 英文分号
+    ", ",    # 英文逗号
+    " ",     # 空格
+    ""       # 字符
+]
+
+
+@lru_cache(maxsize=8)
+def _get_recursive_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """按参数缓存的递归分割器，无每次调用的状态，可安全复用"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=_SPLIT_SEPARATORS
+    )
+
 
 # 本地嵌入模型类（使用 sentence-transformers）
 class LocalEmbeddings(Embeddings):
@@ -32,71 +91,162 @@ class LocalEmbeddings(Embeddings):
         """
         Args:
             model_name: 模型名称，默认使用多语言模型，支持中英文
+
+        设置 EMBEDDING_ONNX_PATH 环境变量时，改为加载导出并 int8 量化后的
+        ONNX 模型（CPU 上约 2-3 倍提速，内存减半），输出与 SBERT 的
+        mean-pooling 一致，下游 FAISS 代码无需改动
         """
         # 设置 Hugging Face 镜像（解决国内下载问题）
         os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
-        
+
+        self.model_name = model_name
+        self._onnx_model = None
+        self._tokenizer = None
+
+        onnx_path = os.getenv("EMBEDDING_ONNX_PATH")
+        if onnx_path:
+            try:
+                from optimum.onnxruntime import ORTModelForFeatureExtraction
+                from transformers import AutoTokenizer
+                print(f"加载 int8 ONNX 嵌入模型: {onnx_path}")
+                self._onnx_model = ORTModelForFeatureExtraction.from_pretrained(
+                    onnx_path, provider="CPUExecutionProvider"
+                )
+                self._tokenizer = AutoTokenizer.from_pretrained(onnx_path)
+                print("ONNX 嵌入模型加载完成\n")
+                return
+            except Exception as e:
+                print(f"ONNX 嵌入模型加载失败，回退到 SentenceTransformer: {e}")
+                self._onnx_model = None
+
         from sentence_transformers import SentenceTransformer
         print(f"加载本地嵌入模型: {model_name}")
         self.model = SentenceTransformer(model_name)
-        self.model_name = model_name
+
+        # GPU 可用时转 FP16：吞吐翻倍、显存减半，嵌入精度损失可忽略
+        try:
+            import torch
+            if torch.cuda.is_available():
+                self.model = self.model.to("cuda").half()
+                print("嵌入模型已转移到 GPU（FP16）")
+        except ImportError:
+            pass
+
+        # 论文文本（题目+摘要）很少超过 256 token，截短序列减少无效计算
+        self.model.max_seq_length = 256
         print("本地嵌入模型加载完成\n")
 
+    def _encode_onnx(self, texts: List[str]) -> np.ndarray:
+        """ONNX 推理 + attention-mask 加权 mean-pooling（与 SBERT 一致）"""
+        embeddings = []
+        batch_size = 64
+        for i in range(0, len(texts), batch_size):
+            inputs = self._tokenizer(
+                texts[i:i + batch_size],
+                padding=True, truncation=True, max_length=256,
+                return_tensors="np"
+            )
+            hidden = self._onnx_model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings.append(pooled)
+        return np.concatenate(embeddings, axis=0)
+
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """
+        批量嵌入文档，返回 float32[N, D] 数组
+
+        构建索引时走这个入口：嵌入矩阵直接交给 FAISS，
+        不经过 List[List[float]] 的 Python 对象往返
+        """
+        if self._onnx_model is not None:
+            return self._encode_onnx(texts).astype(np.float32, copy=False)
+        return self.model.encode(
+            texts,
+            batch_size=256,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=True
+        ).astype(np.float32, copy=False)
+
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """批量嵌入文档"""
-        return self.model.encode(texts, convert_to_numpy=True).tolist()
+        """批量嵌入文档（LangChain 接口，大批次 + 归一化）"""
+        return self.embed_documents_np(texts).tolist()
 
     def embed_query(self, text: str) -> List[float]:
         """嵌入单个查询"""
-        return self.model.encode(text, convert_to_numpy=True).tolist()
+        if self._onnx_model is not None:
+            return self._encode_onnx([text])[0].tolist()
+        return self.model.encode(
+            text, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32).tolist()
 
 
 # 智谱AI嵌入类
 class ZhipuEmbeddings(Embeddings):
     """智谱 AI 嵌入模型封装"""
 
-    def __init__(self, api_key: str, model: str = "embedding-3"):
+    def __init__(self, api_key: str, model: str = "embedding-3",
+                 batch_size: int = 64, max_concurrency: int = 16):
         self.api_key = api_key
         self.model = model
         self.api_url = "https://open.bigmodel.cn/api/paas/v4/embeddings"
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
 
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """批量嵌入文档（同步）"""
+    async def _embed_async(self, texts: List[str]) -> List[List[float]]:
+        """
+        异步批量嵌入
+
+        embedding-3 接口原生支持列表输入：每批 batch_size 条文本
+        一个请求，信号量限制并发批数，整个语料只付一次连接开销
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=32)
+        ) as client:
+
+            async def _post_batch(batch: List[str]) -> List[List[float]]:
+                async with semaphore:
+                    payload = {"model": self.model, "input": batch}
+                    response = await client.post(self.api_url, headers=headers, json=payload)
+                    response.raise_for_status()
+                    result = response.json()
+                    data = result.get("data")
+                    if not data or "embedding" not in data[0]:
+                        print(f"智谱API响应格式错误: {result}")
+                        raise ValueError("智谱API响应格式错误")
+                    # 按 index 对齐，接口不保证返回顺序
+                    return [item["embedding"] for item in sorted(data, key=lambda x: x.get("index", 0))]
+
+            batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+            results = await tqdm_asyncio.gather(
+                *[_post_batch(batch) for batch in batches],
+                desc="生成嵌入向量"
+            )
 
         embeddings = []
+        for batch_embeddings in results:
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量嵌入文档（同步入口，内部并发请求）"""
         try:
-            with httpx.Client(timeout=60.0) as client:
-                # 批量处理，每批 10 个文本
-                batch_size = 10
-                for i in tqdm(range(0, len(texts), batch_size), desc="生成嵌入向量"):
-                    batch_texts = texts[i:i + batch_size]
-
-                    # 单个文本发送请求
-                    batch_embeddings = []
-                    for text in batch_texts:
-                        payload = {
-                            "model": self.model,
-                            "input": text
-                        }
-                        response = client.post(self.api_url, headers=headers, json=payload)
-                        response.raise_for_status()
-                        result = response.json()
-                        if "data" in result and len(result["data"]) > 0 and "embedding" in result["data"][0]:
-                            batch_embeddings.append(result["data"][0]["embedding"])
-                        else:
-                            print(f"智谱API响应格式错误: {result}")
-                            raise ValueError("智谱API响应格式错误")
-
-                    embeddings.extend(batch_embeddings)
+            return asyncio.run(self._embed_async(texts))
         except Exception as e:
             print(f"智谱API调用出错: {str(e)}")
             raise e
 
-        return embeddings
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """批量嵌入文档，返回 float32[N, D] 数组"""
+        return np.asarray(self.embed_documents(texts), dtype=np.float32)
 
     def embed_query(self, text: str) -> List[float]:
         """嵌入单个查询（同步）"""
@@ -113,42 +263,72 @@ def format_paper_document(paper: Dict[str, Any]) -> str:
     Returns:
         格式化后的文本
     """
-    parts = []
+    # 限制作者数量，避免太长
+    authors = paper.get("作者")
+    if authors and len(authors) > 100:
+        authors = authors[:100] + "..."
+
+    # 元组字面量 + 单次 join，替代逐字段 append
+    fields = (
+        ("论文题目", paper.get("论文题目")),
+        ("摘要", paper.get("摘要")),
+        ("关键词", paper.get("关键词")),
+        ("作者", authors),
+        ("期刊/会议", paper.get("期刊/会议名称")),
+        ("发表时间", paper.get("发表时间")),
+    )
+    return "\n".join(f"{name}: {value}" for name, value in fields if value)
 
-    # 论文题目
-    if paper.get("论文题目"):
-        parts.append(f"论文题目: {paper['论文题目']}")
 
-    # 摘要
-    if paper.get("摘要"):
-        parts.append(f"摘要: {paper['摘要']}")
+def iter_papers_from_mongodb(
+    db_name: str = "scholar_db",
+    collection_name: str = "papers",
+    batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式迭代 MongoDB 中的论文数据
 
-    # 关键词
-    if paper.get("关键词"):
-        parts.append(f"关键词: {paper['关键词']}")
+    游标按 batch_size 分批拉取，下游边消费边处理，
+    不会把整个集合一次性物化到内存
 
-    # 作者
-    if paper.get("作者"):
-        # 限制作者数量，避免太长
-        authors = paper['作者']
-        if len(authors) > 100:
-            authors = authors[:100] + "..."
-        parts.append(f"作者: {authors}")
+    Args:
+        db_name: 数据库名称
+        collection_name: 集合名称
+        batch_size: 游标每批拉取的文档数
 
-    # 期刊/会议名称
-    if paper.get("期刊/会议名称"):
-        parts.append(f"期刊/会议: {paper['期刊/会议名称']}")
+    Yields:
+        论文数据字典
+    """
+    print(f"\n{'='*60}")
+    print(f"从 MongoDB 流式加载论文数据...")
+    print(f"数据库: {db_name}, 集合: {collection_name}")
+    print(f"{'='*60}\n")
 
-    # 发表时间
-    if paper.get("发表时间"):
-        parts.append(f"发表时间: {paper['发表时间']}")
+    try:
+        client = get_mongo_client()
+        collection = client[db_name][collection_name]
 
-    return "\n".join(parts)
+        cursor = collection.find(
+            {},
+            projection=_EMBED_PROJECTION,
+            batch_size=batch_size,
+            no_cursor_timeout=True
+        )
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    except Exception as e:
+        print(f"从 MongoDB 加载数据失败: {str(e)}")
+        raise
 
 
 def load_papers_from_mongodb(db_name: str = "scholar_db", collection_name: str = "papers") -> List[Dict[str, Any]]:
     """
-    从 MongoDB 加载所有论文数据
+    从 MongoDB 加载所有论文数据（一次性物化为列表）
+
+    大语料请改用 iter_papers_from_mongodb 流式消费
 
     Args:
         db_name: 数据库名称
@@ -157,38 +337,27 @@ def load_papers_from_mongodb(db_name: str = "scholar_db", collection_name: str =
     Returns:
         论文数据列表
     """
-    print(f"\n{'='*60}")
-    print(f"从 MongoDB 加载论文数据...")
-    print(f"数据库: {db_name}, 集合: {collection_name}")
-    print(f"{'='*60}\n")
-
-    try:
-        client = get_mongo_client()
-        db = client[db_name]
-        collection = db[collection_name]
+    papers = list(iter_papers_from_mongodb(db_name, collection_name))
+    print(f"成功加载 {len(papers)} 篇论文\n")
+    return papers
 
-        # 统计文档数量
-        total_count = collection.count_documents({})
-        print(f"找到 {total_count} 篇论文\n")
 
-        if total_count == 0:
-            print("警告: 数据库中没有论文数据!")
-            return []
+def _paper_cache_key(paper: Dict[str, Any]) -> str:
+    """缓存键：_id + 内容摘要，论文内容变化时自动失效"""
+    digest = hashlib.blake2b(
+        json.dumps(paper, sort_keys=True, default=str, ensure_ascii=False).encode(),
+        digest_size=8
+    ).hexdigest()
+    return f"{paper.get('_id', '')}:{digest}"
 
-        # 加载所有论文
-        papers = list(collection.find({}))
 
-        print(f"成功加载 {len(papers)} 篇论文\n")
-        return papers
-
-    except Exception as e:
-        print(f"从 MongoDB 加载数据失败: {str(e)}")
-        raise
-
-
-def prepare_documents_for_embedding(papers: List[Dict[str, Any]]) -> List[str]:
+def prepare_documents_for_embedding(papers: Iterable[Dict[str, Any]]) -> List[str]:
     """
-    将论文数据准备为可嵌入的文档列表
+    将论文数据准备为可嵌入的文档列表（可直接消费流式游标）
+
+    设置 PAPER_FORMAT_CACHE 环境变量时启用 shelve 磁盘缓存：
+    按 _id + 内容哈希缓存格式化结果，重复重建索引时未变化的
+    论文不再重新格式化
 
     Args:
         papers: 论文数据列表
@@ -200,12 +369,32 @@ def prepare_documents_for_embedding(papers: List[Dict[str, Any]]) -> List[str]:
     print(f"准备文档用于嵌入...")
     print(f"{'='*60}\n")
 
+    cache = None
+    cache_path = os.getenv("PAPER_FORMAT_CACHE")
+    if cache_path:
+        try:
+            cache = shelve.open(cache_path)
+        except Exception as e:
+            print(f"格式化缓存打开失败，跳过缓存: {e}")
+            cache = None
+
     documents = []
+    try:
+        for paper in tqdm(papers, desc="格式化文档"):
+            if cache is not None:
+                key = _paper_cache_key(paper)
+                formatted_text = cache.get(key)
+                if formatted_text is None:
+                    formatted_text = format_paper_document(paper)
+                    cache[key] = formatted_text
+            else:
+                formatted_text = format_paper_document(paper)
 
-    for paper in tqdm(papers, desc="格式化文档"):
-        formatted_text = format_paper_document(paper)
-        if formatted_text.strip():
-            documents.append(formatted_text)
+            if formatted_text.strip():
+                documents.append(formatted_text)
+    finally:
+        if cache is not None:
+            cache.close()
 
     print(f"\n共准备 {len(documents)} 个文档\n")
     return documents
@@ -239,67 +428,16 @@ def split_documents_by_strategy(
 
     chunks = []
 
-    if split_strategy == "recursive":
-        # 递归字符分割（快速，但不够智能）
-        print("使用递归字符分割...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=[
-                "\n\n",  # 段落
-                "\n",    # 行
-                "。",    # 中文句号
-                "！",    # 中文感叹号
-                "？",    # 中文问号
-                "；",    # 中文分号
-                "，",    # 中文逗号
-                ". ",    # 英文句号
-                "! ",    # 英文感叹号
-                "? ",    # 英文问号
-                "; ",    # 英文分号
-                ", ",    # 英文逗号
-                " ",     # 空格
-                ""       # 字符
-            ]
-        )
-
-        for doc in tqdm(documents, desc="递归分割文档"):
-            doc_chunks = text_splitter.split_text(doc)
-            chunks.extend(doc_chunks)
-
-    elif split_strategy == "semantic":
-        # 语义分割在新版本中不可用，回退到递归分割
-        print("语义分割在新版本中不可用，使用递归分割...")
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=[
-                "\n\n",  # 段落
-                "\n",    # 行
-                "。",    # 中文句号
-                "！",    # 中文感叹号
-                "？",    # 中文问号
-                "；",    # 中文分号
-                "，",    # 中文逗号
-                ". ",    # 英文句号
-                "! ",    # 英文感叹号
-                "? ",    # 英文问号
-                "; ",    # 英文分号
-                ", ",    # 英文逗号
-                " ",     # 空格
-                ""       # 字符
-            ]
-        )
+    if split_strategy in ("recursive", "semantic"):
+        # 语义分割在新版本中不可用，两种策略都走递归字符分割
+        if split_strategy == "semantic":
+            print("语义分割在新版本中不可用，使用递归分割...")
+        else:
+            print("使用递归字符分割...")
 
+        text_splitter = _get_recursive_splitter(chunk_size, chunk_overlap)
         for doc in tqdm(documents, desc="递归分割文档"):
-            doc_chunks = text_splitter.split_text(doc)
-            chunks.extend(doc_chunks)
-            return split_documents_by_strategy(
-                documents, embeddings, "recursive",
-                chunk_size, chunk_overlap
-            )
+            chunks.extend(text_splitter.split_text(doc))
 
     elif split_strategy == "structured":
         # 结构化分割（基于论文的字段结构）
@@ -328,27 +466,87 @@ def split_documents_structured(documents: List[str]) -> List[str]:
     chunks = []
 
     for doc in tqdm(documents, desc="结构化分割"):
-        # 按标记分割字段
-        lines = doc.split('\n')
-        current_chunk = ""
-
-        for line in lines:
-            if line.startswith(("论文题目:", "摘要:", "关键词:", "作者:", "期刊/会议:", "发表时间:")):
-                # 遇到新字段，保存当前块（如果有）
-                if current_chunk.strip():
-                    chunks.append(current_chunk.strip())
-                current_chunk = line
-            else:
-                # 继续当前块
-                current_chunk += "\n" + line
-
-        # 保存最后一个块
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        # 按字段边界一次切分，替代逐行 startswith + 字符串拼接
+        chunks.extend(s.strip() for s in _FIELD_RE.split(doc) if s.strip())
 
     return chunks
 
 
+# 超过该规模后改用 IVF-PQ 倒排量化索引；中等规模用 HNSW 图索引
+_IVF_MIN_VECTORS = 2048
+_HNSW_MIN_VECTORS = 256
+
+
+def _pq_subquantizers(d: int, preferred: int = 48) -> int:
+    """PQ 子量化器个数必须整除向量维度，从 preferred 向下找最大可行值"""
+    for m in (preferred, 64, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= preferred and d % m == 0:
+            return m
+    return 1
+
+
+def _create_faiss_index(vectors: np.ndarray) -> "faiss.Index":
+    """
+    根据向量规模选择合适的 FAISS 索引类型
+
+    向量已归一化，统一用内积度量（等价余弦相似度）：
+    - 小语料：精确 FlatIP
+    - 中等规模：HNSW 图索引，亚线性检索、全精度存储
+    - 大语料：IVF-PQ，先聚类再搜索 nprobe 个簇，PQ 量化把
+      存储从 4*N*D 字节压到约 N*m 字节
+
+    Args:
+        vectors: float32 向量矩阵 [N, D]（已归一化）
+
+    Returns:
+        已添加向量的 FAISS 索引
+    """
+    n, d = vectors.shape
+
+    if n >= _IVF_MIN_VECTORS:
+        nlist = int(4 * math.sqrt(n))
+        m = _pq_subquantizers(d)
+        print(f"使用 IVF-PQ 索引 (nlist={nlist}, m={m}, nprobe=16)")
+        quantizer = faiss.IndexFlatIP(d)
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = 16
+    elif n >= _HNSW_MIN_VECTORS:
+        print("使用 HNSW 索引 (M=32, efConstruction=200, efSearch=64)")
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+    else:
+        print("语料较小，使用精确 FlatIP 索引")
+        index = faiss.IndexFlatIP(d)
+
+    index.add(vectors)
+    return index
+
+
+def _wrap_langchain_faiss(chunks: List[str], embeddings: Embeddings, index: "faiss.Index") -> FAISS:
+    """将已构建的 FAISS 索引包装为 LangChain 的 FAISS 向量库"""
+    ids = [str(uuid4()) for _ in chunks]
+    docstore = InMemoryDocstore(
+        {doc_id: Document(page_content=chunk) for doc_id, chunk in zip(ids, chunks)}
+    )
+    index_to_docstore_id = {i: doc_id for i, doc_id in enumerate(ids)}
+
+    # 内积索引要告知 LangChain 分数方向（越大越相似）
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+    else:
+        distance_strategy = DistanceStrategy.EUCLIDEAN_DISTANCE
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=distance_strategy
+    )
+
+
 def build_faiss_index(
     documents: List[str],
     embeddings: Embeddings,
@@ -389,9 +587,14 @@ def build_faiss_index(
         chunk_overlap
     )
 
-    # 构建向量索引
+    # 构建向量索引；优先走 float32 数组路径，避免 Python 浮点对象往返
     print("构建向量索引...")
-    vector_store = FAISS.from_texts(chunks, embeddings)
+    if hasattr(embeddings, "embed_documents_np"):
+        vectors = embeddings.embed_documents_np(chunks)
+    else:
+        vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    index = _create_faiss_index(vectors)
+    vector_store = _wrap_langchain_faiss(chunks, embeddings, index)
 
     print(f"\n向量索引构建成功!\n")
     return vector_store
@@ -442,6 +645,15 @@ def load_faiss_index(load_path: str, embeddings: Embeddings) -> FAISS:
 
     try:
         vector_store = FAISS.load_local(load_path, embeddings, allow_dangerous_deserialization=True)
+
+        # 可选：将索引搬到 GPU（需要 faiss-gpu）
+        if os.getenv("FAISS_USE_GPU") == "1":
+            try:
+                vector_store.index = faiss.index_cpu_to_all_gpus(vector_store.index)
+                print("FAISS 索引已转移到 GPU")
+            except Exception as e:
+                print(f"FAISS GPU 转移失败，继续使用 CPU: {e}")
+
         print(f"FAISS 索引加载成功!\n")
         return vector_store
     except Exception as e:
@@ -449,6 +661,104 @@ def load_faiss_index(load_path: str, embeddings: Embeddings) -> FAISS:
         raise
 
 
+def _build_vector_store_pipelined(
+    embeddings: Embeddings,
+    db_name: str,
+    collection_name: str,
+    split_strategy: str = "recursive",
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    encode_batch: int = 256
+) -> Optional[FAISS]:
+    """
+    流水线式构建向量库：Mongo 读取、格式化/分割、嵌入三个阶段重叠执行
+
+    后台线程流式读 Mongo 并预取到有界队列；主线程边消费边格式化、
+    分割，攒满 encode_batch 个文本块就嵌入一批。总耗时趋近于
+    最慢阶段的耗时，而不是各阶段之和，且任何阶段都不会把完整
+    语料物化到内存
+
+    Returns:
+        构建好的 FAISS 向量库，语料为空时返回 None
+    """
+    raw_queue: "queue_module.Queue" = queue_module.Queue(maxsize=4096)
+    sentinel = object()
+
+    def _reader():
+        try:
+            for paper in iter_papers_from_mongodb(db_name, collection_name):
+                raw_queue.put(paper)
+        finally:
+            raw_queue.put(sentinel)
+
+    threading.Thread(target=_reader, daemon=True).start()
+
+    # 每篇文档的分割函数（不经过 split_documents_by_strategy 的批量入口）
+    if split_strategy in ("recursive", "semantic"):
+        splitter = _get_recursive_splitter(chunk_size, chunk_overlap)
+        split_fn = splitter.split_text
+    elif split_strategy == "structured":
+        split_fn = lambda doc: [s.strip() for s in _FIELD_RE.split(doc) if s.strip()]
+    else:
+        raise ValueError(f"未知的分割策略: {split_strategy}")
+
+    cache = None
+    cache_path = os.getenv("PAPER_FORMAT_CACHE")
+    if cache_path:
+        try:
+            cache = shelve.open(cache_path)
+        except Exception as e:
+            print(f"格式化缓存打开失败，跳过缓存: {e}")
+
+    chunks: List[str] = []
+    vector_parts: List[np.ndarray] = []
+    batch: List[str] = []
+
+    def _encode(texts: List[str]) -> np.ndarray:
+        if hasattr(embeddings, "embed_documents_np"):
+            return embeddings.embed_documents_np(texts)
+        return np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+    try:
+        while True:
+            paper = raw_queue.get()
+            if paper is sentinel:
+                break
+
+            if cache is not None:
+                key = _paper_cache_key(paper)
+                formatted_text = cache.get(key)
+                if formatted_text is None:
+                    formatted_text = format_paper_document(paper)
+                    cache[key] = formatted_text
+            else:
+                formatted_text = format_paper_document(paper)
+
+            if not formatted_text.strip():
+                continue
+
+            for chunk in split_fn(formatted_text):
+                chunks.append(chunk)
+                batch.append(chunk)
+                if len(batch) >= encode_batch:
+                    vector_parts.append(_encode(batch))
+                    batch = []
+
+        if batch:
+            vector_parts.append(_encode(batch))
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if not chunks:
+        return None
+
+    vectors = np.vstack(vector_parts)
+    print(f"\n流水线处理完成：{len(chunks)} 个文本块")
+    index = _create_faiss_index(vectors)
+    return _wrap_langchain_faiss(chunks, embeddings, index)
+
+
 def build_and_save_vector_store(
     db_name: str = "scholar_db",
     collection_name: str = "papers",
@@ -497,25 +807,20 @@ def build_and_save_vector_store(
 
         print("嵌入模型初始化完成\n")
 
-        # 2. 从 MongoDB 加载论文数据
-        papers = load_papers_from_mongodb(db_name, collection_name)
-
-        if not papers:
-            print("错误: 没有论文数据，无法构建向量库!")
-            return None
-
-        # 3. 准备文档
-        documents = prepare_documents_for_embedding(papers)
-
-        # 4. 构建向量索引
-        vector_store = build_faiss_index(
-            documents,
+        # 2-4. 流水线构建：Mongo 读取、格式化/分割、嵌入重叠执行
+        vector_store = _build_vector_store_pipelined(
             embeddings,
+            db_name,
+            collection_name,
             split_strategy,
             chunk_size,
             chunk_overlap
         )
 
+        if vector_store is None:
+            print("错误: 没有论文数据，无法构建向量库!")
+            return None
+
         # 5. 保存索引
         if save_path is None:
             # 默认保存到项目根目录
@@ -529,8 +834,7 @@ def build_and_save_vector_store(
 
         print(f"\n{'#'*60}")
         print(f"# 向量库构建完成!")
-        print(f"# 论文数量: {len(papers)}")
-        print(f"# 文档数量: {len(documents)}")
+        print(f"# 文本块数量: {vector_store.index.ntotal}")
         print(f"# 分割策略: {split_strategy}")
         print(f"# 耗时: {elapsed_time:.2f} 秒")
         print(f"# 保存路径: {save_path}")
@@ -0,0 +1,81 @@
+"""通用工具函数 - LLM 回复的 JSON 提取与解析"""
+
+import json
+
+import orjson
+
+
+def find_balanced_slice(text: str, opener: str = "{", closer: str = "}"):
+    """
+    单次扫描找到第一段括号配平的切片
+
+    用小状态机跟踪括号深度和字符串字面量（忽略字符串内的括号），
+    替代 find/rfind 的两端猜测
+
+    Args:
+        text: 原始文本
+        opener: 起始括号（"{" 或 "["）
+        closer: 结束括号
+
+    Returns:
+        最小配平的子串，未找到时返回 None
+    """
+    start = -1
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for i, ch in enumerate(text):
+        if start == -1:
+            if ch == opener:
+                start = i
+                depth = 1
+            continue
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch == opener:
+            depth += 1
+        elif ch == closer:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    return None
+
+
+def loads_fast(text: str):
+    """
+    解析 JSON 字符串：优先 orjson（C 实现），失败回退 stdlib json
+
+    Returns:
+        解析结果，两种解析器都失败时返回 None
+    """
+    try:
+        return orjson.loads(text)
+    except Exception:
+        pass
+    try:
+        return json.loads(text)
+    except Exception:
+        return None
+
+
+def extract_json(text: str, opener: str = "{", closer: str = "}"):
+    """
+    从 LLM 回复中提取并解析第一段配平的 JSON
+
+    Returns:
+        解析结果，未找到或解析失败时返回 None
+    """
+    candidate = find_balanced_slice(text, opener, closer)
+    if candidate is None:
+        return None
+    return loads_fast(candidate)
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# 测试库走 SQLite 模板复制：schema 只在模板文件上建一次，之后每次
+# 运行只做一次文件拷贝，跳过 create_all 的整轮 CREATE TABLE 往返。
+# 模型有变更时删除模板文件即可触发重建。
+# 必须在导入 app 之前设置环境变量：engine 在 app.db.session 导入时创建
+_TMP_DIR = Path(tempfile.gettempdir())
+_TEMPLATE_DB = _TMP_DIR / "scholar_template.db"
+_TEST_DB = _TMP_DIR / f"scholar_test_{os.getpid()}.db"
+
+os.environ["DATABASE_URL"] = f"sqlite:///{_TEST_DB}"
+os.environ["AUTO_MIGRATE"] = "0"  # 建表由模板复制完成，应用导入时不再 create_all
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from app.db.session import Base  # noqa: E402
+from app.models import User  # noqa: E402,F401  导入以注册表定义
+
+if not _TEMPLATE_DB.exists():
+    _template_engine = create_engine(f"sqlite:///{_TEMPLATE_DB}")
+    Base.metadata.create_all(bind=_template_engine)
+    _template_engine.dispose()
+
+shutil.copyfile(_TEMPLATE_DB, _TEST_DB)
+
+
+# app.main 不在模块顶层导入：收集阶段（--collect-only、-k 过滤）
+# 不触发应用启动副作用，只有真正请求 fixture 时才加载应用
+
+
+@pytest.fixture(scope="session", autouse=True)
+def stub_llm():
+    """测试会话内不触网：LLM 工厂替换为返回空 JSON 的本地假模型
+
+    各 API 模块用 from app.llm import get_chat_model 把工厂导进了
+    自己的命名空间，所以逐模块替换，结束后恢复原实现
+    """
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    from app import llm as llm_module
+    from app.api import chat_rag, navigator, papers
+
+    fake = FakeListChatModel(responses=["{}"])
+
+    def fake_factory(model="glm-4", temperature=0.7):
+        return fake
+
+    patched = []
+    for mod in (llm_module, papers, navigator, chat_rag):
+        patched.append((mod, mod.get_chat_model))
+        mod.get_chat_model = fake_factory
+    yield
+    for mod, original in patched:
+        mod.get_chat_model = original
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hash():
+    """测试会话内用明文替身替换 bcrypt 散列
+
+    bcrypt 故意设计得慢（单次几十毫秒），注册/登录测试不需要真实散列，
+    只需要 hash/verify 互相一致。仅修改 app.api.users 的模块级函数，
+    结束后恢复原实现。
+    """
+    from app.api import users as users_api
+
+    real_hash = users_api.hash_password
+    real_verify = users_api.verify_password
+    users_api.hash_password = lambda password: "plain$" + password
+    users_api.verify_password = lambda plain, hashed: hashed == "plain$" + plain
+    yield
+    users_api.hash_password = real_hash
+    users_api.verify_password = real_verify
+
+
+@pytest.fixture(scope="session")
+def client():
+    """会话级测试客户端：startup/shutdown 事件整个会话只执行一次
+
+    TestClient 本身就是 httpx.Client，内部只创建一个 ASGI transport，
+    会话级复用后所有请求共享同一 transport（httpx 的 ASGITransport
+    仅支持异步客户端，同步路径沿用 TestClient 自带的 transport）
+    """
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+async def app_ctx():
+    """会话级应用生命周期：lifespan 启停只执行一次
+
+    ASGITransport 本身不会触发 lifespan，由 LifespanManager 统一托管；
+    之后无论挂多少个客户端（不同认证头等），都复用同一个已启动的应用
+    """
+    from asgi_lifespan import LifespanManager
+
+    from app.main import app
+
+    async with LifespanManager(app):
+        yield app
+
+
+@pytest.fixture(scope="session")
+async def async_client(app_ctx):
+    """会话级异步客户端：同组并发测试共享同一 ASGI transport"""
+    from httpx import ASGITransport, AsyncClient
+
+    async with AsyncClient(transport=ASGITransport(app=app_ctx), base_url="http://test") as c:
+        yield c